@@ -27,6 +27,7 @@ ENV_FILE="$PYTHON_DIR/.env"
 # Configurable variables
 CONSUMER_GROUP="demo-dr-consumer-group"
 MESSAGE_INTERVAL="1.0"
+BATCH_SIZE="100"
 
 # Ensure the Python directory exists
 mkdir -p "$PYTHON_DIR"
@@ -98,6 +99,7 @@ CONSUMER_GROUP=$CONSUMER_GROUP
 # Producer config only
 # =============================================================================
 MESSAGE_INTERVAL=$MESSAGE_INTERVAL
+BATCH_SIZE=$BATCH_SIZE
 EOF
 
 # -----------------------------------------------------------------------------
@@ -129,6 +131,7 @@ CONSUMER_GROUP=$CONSUMER_GROUP
 # Producer config only
 # =============================================================================
 MESSAGE_INTERVAL=$MESSAGE_INTERVAL
+BATCH_SIZE=$BATCH_SIZE
 EOF
 
 echo -e "\n[INFO] Created $PYTHON_DIR/east.env and $PYTHON_DIR/west.env successfully.\n"
@@ -5,12 +5,16 @@ avro_consumer_app.py
 A Python consumer application that:
   1. Connects to Confluent Cloud Kafka (SASL_SSL, PLAIN).
   2. Connects to Confluent Cloud Schema Registry to deserialize Avro messages.
-  3. Subscribes to a specified topic and continuously polls for records.
+  3. Subscribes to a specified topic and continuously consumes records in
+     batches of up to 'MAX_POLL_RECORDS'.
   4. Prints out Avro-deserialized records in the console.
+  5. Optionally runs 'WORKERS' consumer processes in the same consumer group,
+     so partitions are decoded in parallel without sharing one GIL.
 
 Prerequisites:
   - Install dependencies:
       - pip install "confluent-kafka[avro]" "python-dotenv"
+      - Optional, for faster record logging: pip install orjson
   - Ensure you have a Confluent Cloud Kafka cluster with appropriate permissions:
       - API Key/Secret with consume access to the Kafka cluster.
       - Schema Registry API Key/Secret with READ permissions.
@@ -24,6 +28,14 @@ Prerequisites:
       - `SCHEMA_REGISTRY_API_SECRET` → Schema Registry API secret
   - Optional environment variables:
       - `CONSUMER_GROUP` → Consumer group ID (default provided in `.env`)
+      - `MAX_POLL_RECORDS` → Max messages fetched per consume() call (default: `500`)
+      - `WORKERS` → Consumer processes to run in the consumer group (default: `1`).
+        Set it no higher than the topic's partition count; extra workers stay idle.
+      - `RAW_MODE` → Set to `1` to skip Avro decoding and log each record's size, schema ID
+        and CRC32 only, e.g. for replication checks (default: `0`)
+      - `FETCH_MIN_BYTES` → Min bytes a broker accumulates before answering a fetch (default: `65536`)
+      - `FETCH_WAIT_MAX_MS` → Max time a broker waits to reach FETCH_MIN_BYTES (default: `100`).
+        Larger fetches mean fewer round trips, at the cost of up to this much added latency.
 
 Usage:
   1. Optionally, specify "east" or "west" as a command-line argument to load
@@ -40,13 +52,20 @@ Press Ctrl+C or send SIGTERM to exit gracefully.
 
 import os
 import sys
+import json
 import time
 import signal
+import struct
+import zlib
+import functools
+import threading
+import multiprocessing as mp
+from io import BytesIO
+from concurrent.futures import ThreadPoolExecutor
+import fastavro
 from dotenv import load_dotenv
-from confluent_kafka import DeserializingConsumer, KafkaError
-from confluent_kafka.serialization import StringDeserializer
-from confluent_kafka.schema_registry import SchemaRegistryClient
-from confluent_kafka.schema_registry.avro import AvroDeserializer
+from confluent_kafka import Consumer, KafkaError
+from common import get_sr_client, format_record
 
 # =============================================================================
 # Load Environment Variables
@@ -74,119 +93,354 @@ def load_environment_file():
         print(f"[ERROR] {env_file} does not exist. Please generate or provide it.")
         sys.exit(1)
 
-# Invoke environment loading as soon as the script starts
-load_environment_file()
-
 # =============================================================================
 # Environment-Based Configurations
 # =============================================================================
-BOOTSTRAP_SERVER = os.getenv("BOOTSTRAP_SERVER")
-SASL_USERNAME = os.getenv("SASL_USERNAME")
-SASL_PASSWORD = os.getenv("SASL_PASSWORD")
-TOPIC_NAME = os.getenv("TOPIC_NAME")
-CONSUMER_GROUP = os.getenv("CONSUMER_GROUP")
+def load_config():
+    """
+    Validates that all required variables are set and returns the consumer
+    settings as a dictionary keyed by variable name. The environment file
+    must already be loaded (see load_environment_file()).
+    """
+    # Check for required variables
+    required_vars = [
+        "BOOTSTRAP_SERVER", "SASL_USERNAME", "SASL_PASSWORD",
+        "TOPIC_NAME", "SCHEMA_REGISTRY_URL",
+        "SCHEMA_REGISTRY_API_KEY", "SCHEMA_REGISTRY_API_SECRET"
+    ]
+    missing_vars = [v for v in required_vars if not os.getenv(v)]
+    if missing_vars:
+        print(f"[ERROR] Missing environment variables: {', '.join(missing_vars)}")
+        sys.exit(1)
 
-SCHEMA_REGISTRY_URL = os.getenv("SCHEMA_REGISTRY_URL")
-SCHEMA_REGISTRY_API_KEY = os.getenv("SCHEMA_REGISTRY_API_KEY")
-SCHEMA_REGISTRY_API_SECRET = os.getenv("SCHEMA_REGISTRY_API_SECRET")
+    # If CONSUMER_GROUP is not set, use this default value
+    consumer_group = os.getenv("CONSUMER_GROUP")
+    if not consumer_group:
+        consumer_group = "demo-dr-consumer-group"
+        print(f"[WARN] 'CONSUMER_GROUP' is not set. Using default: {consumer_group}")
 
-# Check for required variables
-required_vars = [
-    "BOOTSTRAP_SERVER", "SASL_USERNAME", "SASL_PASSWORD",
-    "TOPIC_NAME", "SCHEMA_REGISTRY_URL",
-    "SCHEMA_REGISTRY_API_KEY", "SCHEMA_REGISTRY_API_SECRET"
-]
-missing_vars = [v for v in required_vars if not os.getenv(v)]
-if missing_vars:
-    print(f"[ERROR] Missing environment variables: {', '.join(missing_vars)}")
-    sys.exit(1)
+    return {
+        "BOOTSTRAP_SERVER": os.getenv("BOOTSTRAP_SERVER"),
+        "SASL_USERNAME": os.getenv("SASL_USERNAME"),
+        "SASL_PASSWORD": os.getenv("SASL_PASSWORD"),
+        "TOPIC_NAME": os.getenv("TOPIC_NAME"),
+        "CONSUMER_GROUP": consumer_group,
+        "SCHEMA_REGISTRY_URL": os.getenv("SCHEMA_REGISTRY_URL"),
 
-# If CONSUMER_GROUP is not set, use this default value
-if not CONSUMER_GROUP:
-    CONSUMER_GROUP = "demo-dr-consumer-group"
-    print(f"[WARN] 'CONSUMER_GROUP' is not set. Using default: {CONSUMER_GROUP}")
+        # Optional configurations
+        "MAX_POLL_RECORDS": int(os.getenv("MAX_POLL_RECORDS", "500")),  # messages per consume() call
+        "RAW_MODE": os.getenv("RAW_MODE", "0").lower() in ("1", "true", "yes"),
+        "FETCH_MIN_BYTES": int(os.getenv("FETCH_MIN_BYTES", "65536")),
+        "FETCH_WAIT_MAX_MS": int(os.getenv("FETCH_WAIT_MAX_MS", "100"))  # also the worst-case added latency
+    }
 
 # =============================================================================
-# Configure Schema Registry
+# Avro Decoding
 # =============================================================================
-schema_registry_conf = {
-    "url": SCHEMA_REGISTRY_URL,
-    "basic.auth.user.info": f"{SCHEMA_REGISTRY_API_KEY}:{SCHEMA_REGISTRY_API_SECRET}"
-}
-schema_registry_client = SchemaRegistryClient(schema_registry_conf)
+# Upper bound on cached parsed schemas; least recently used IDs are evicted,
+# so memory stays bounded as schemas evolve in a long-running consumer
+SCHEMA_CACHE_SIZE = 1000
+
+@functools.lru_cache(maxsize=SCHEMA_CACHE_SIZE)
+def get_parsed_schema(schema_id):
+    """
+    Fetch the writer schema for a schema ID from Schema Registry and parse it
+    with fastavro, together with any schemas it references. Results are cached
+    (bounded LRU) so each schema ID is only fetched and parsed once while it
+    stays in use.
+    """
+    schema = get_sr_client().get_schema(schema_id)
+    named_schemas = {}
+    resolve_schema_references(schema, named_schemas)
+    return fastavro.parse_schema(json.loads(schema.schema_str), named_schemas=named_schemas)
+
+def resolve_schema_references(schema, named_schemas):
+    """
+    Parse every schema referenced by 'schema' (depth first, by subject and
+    version) into 'named_schemas', so the referencing schema can be parsed
+    against the named types they define.
+    """
+    for ref in schema.references or []:
+        referenced = get_sr_client().get_version(ref.subject, ref.version).schema
+        resolve_schema_references(referenced, named_schemas)
+        fastavro.parse_schema(json.loads(referenced.schema_str), named_schemas=named_schemas)
 
-# AvroDeserializer with no explicit schema => it fetches from SR using the record's schema ID
-avro_deserializer = AvroDeserializer(schema_registry_client, None)
+def peek_schema_id(raw):
+    """
+    Return the schema ID from a Confluent wire-format message header without
+    decoding the payload, or None if the message is not in that format.
+    """
+    if raw is None or len(raw) < 5 or raw[0] != 0:
+        return None
+    return struct.unpack('>I', raw[1:5])[0]
+
+def decode_avro(raw):
+    """
+    Decode a Confluent wire-format Avro message (magic byte, 4-byte schema ID,
+    Avro payload) into a Python dictionary.
+    """
+    if raw is None:
+        return None
+    schema_id = peek_schema_id(raw)
+    if schema_id is None:
+        raise ValueError("Message is not in the Confluent Avro wire format")
+
+    buf = BytesIO(raw)
+    buf.seek(5)
+    return fastavro.schemaless_reader(buf, get_parsed_schema(schema_id))
+
+def decode_batch(values):
+    """
+    Decode a list of raw message values in one go. Returns one entry per
+    value: the decoded record, or the exception raised while decoding it.
+    """
+    results = []
+    for raw in values:
+        try:
+            results.append(decode_avro(raw))
+        except Exception as err:
+            results.append(err)
+    return results
+
+# =============================================================================
+# Buffered Logging
+# =============================================================================
+LOG_FLUSH_LINES = 256     # flush after this many buffered lines...
+LOG_FLUSH_INTERVAL = 1.0  # ...or after this many seconds, whichever comes first
+
+_log_buffer = []
+_log_last_flush = time.monotonic()
+
+def flush_log():
+    """
+    Write all buffered log lines to stdout in a single call.
+    """
+    global _log_last_flush
+    if _log_buffer:
+        sys.stdout.write("\n".join(_log_buffer) + "\n")
+        sys.stdout.flush()
+        _log_buffer.clear()
+    _log_last_flush = time.monotonic()
+
+def log(line):
+    """
+    Buffer a log line for the hot path instead of printing it immediately.
+    """
+    _log_buffer.append(line)
+    if len(_log_buffer) >= LOG_FLUSH_LINES or time.monotonic() - _log_last_flush > LOG_FLUSH_INTERVAL:
+        flush_log()
 
 # =============================================================================
 # Configure the Consumer
 # =============================================================================
-consumer_conf = {
-    "bootstrap.servers": BOOTSTRAP_SERVER,
-    "security.protocol": "SASL_SSL",
-    "sasl.mechanism": "PLAIN",
-    "sasl.username": SASL_USERNAME,
-    "sasl.password": SASL_PASSWORD,
-    "key.deserializer": StringDeserializer('utf_8'),
-    "value.deserializer": avro_deserializer,
-    "group.id": CONSUMER_GROUP,  # Keep consistent across regions for offset sync if needed
-    "auto.offset.reset": "earliest"  # or "latest", depending on your use case
-}
+def _build():
+    """
+    Loads the configuration and creates the consumer and its decode pool.
+    Nothing connects to Kafka or Schema Registry until this is called, so the
+    module can be imported (or a process forked) without side effects.
+
+    Returns a (consumer, decode_pool, config) tuple.
+    """
+    config = load_config()
+
+    consumer_conf = {
+        "bootstrap.servers": config["BOOTSTRAP_SERVER"],
+        "security.protocol": "SASL_SSL",
+        "sasl.mechanism": "PLAIN",
+        "sasl.username": config["SASL_USERNAME"],
+        "sasl.password": config["SASL_PASSWORD"],
+        "group.id": config["CONSUMER_GROUP"],  # Keep consistent across regions for offset sync if needed
+        "auto.offset.reset": "earliest",  # or "latest", depending on your use case
+        # Fetch sizing: fewer, larger fetches. Raises tail latency by up to fetch.wait.max.ms
+        "fetch.min.bytes": config["FETCH_MIN_BYTES"],
+        "fetch.wait.max.ms": config["FETCH_WAIT_MAX_MS"]
+    }
 
-consumer = DeserializingConsumer(consumer_conf)
+    # Decodes one batch while the next batch is being fetched. At most one batch
+    # is in flight, so a single thread is all the pool can use
+    decode_pool = ThreadPoolExecutor(max_workers=1)
+
+    return Consumer(consumer_conf), decode_pool, config
+
+# =============================================================================
+# Record Logging
+# =============================================================================
+def log_decoded_batch(msgs, results):
+    """
+    Log each record of a decoded batch in offset order. 'results' holds, per
+    message, the decoded record or the exception raised while decoding it.
+    """
+    _log = log
+    for msg, record_value in zip(msgs, results):
+        partition = msg.partition()
+        offset = msg.offset()
+        try:
+            if isinstance(record_value, Exception):
+                raise record_value
+            line = f"[INFO] Consumed record @ offset {offset}, partition {partition}: {format_record(record_value)}"
+        except Exception as err:
+            _log(f"[ERROR] Failed to decode record @ offset {offset}, partition {partition}: {err}")
+            continue
+
+        # Log the consumed record
+        _log(line)
 
 # =============================================================================
 # Graceful Shutdown Handling
 # =============================================================================
-def handle_shutdown(sig, frame):
+def install_shutdown_handler():
+    """
+    Registers a handler for SIGINT and SIGTERM that asks the main loop to stop.
+    Returns the event the handler sets; the loop finishes logging the records
+    it has already consumed before closing the consumer, because closing
+    commits their offsets.
+    """
+    stop = threading.Event()
+
+    def handle_shutdown(sig, frame):
+        stop.set()
+
+    signal.signal(signal.SIGINT, handle_shutdown)
+    signal.signal(signal.SIGTERM, handle_shutdown)
+    return stop
+
+def close_consumer(consumer, decode_pool):
     """
-    On SIGINT or SIGTERM, close the consumer gracefully and exit.
+    Closes the consumer (committing its offsets) and the decode pool, then
+    reports schema cache usage.
     """
+    flush_log()
     print("\n[INFO] Shutdown signal received. Closing consumer.")
     consumer.close()
-    sys.exit(0)
+    decode_pool.shutdown()
+    cache = get_parsed_schema.cache_info()
+    print(f"[INFO] Schema cache: {cache.currsize}/{cache.maxsize} entries, "
+          f"{cache.hits} hits, {cache.misses} misses.")
 
-signal.signal(signal.SIGINT, handle_shutdown)
-signal.signal(signal.SIGTERM, handle_shutdown)
+# =============================================================================
+# Idle Backoff
+# =============================================================================
+# consume() blocks inside librdkafka for its whole timeout, which keeps serving
+# the consumer group, so an idle topic waits longer per call rather than sleeping
+CONSUME_TIMEOUT = 1.0       # seconds per consume() while messages are flowing...
+CONSUME_TIMEOUT_MAX = 5.0   # ...doubling per empty fetch up to this cap
 
 # =============================================================================
 # Main Consumer Loop
 # =============================================================================
 def main():
     """
-    Subscribes to the specified Kafka topic and continuously polls for records.
-    Deserializes Avro messages, then prints them to the console.
+    Subscribes to the specified Kafka topic and continuously consumes records
+    in batches. Deserializes Avro messages, then prints them to the console.
     """
-    print(f"[INFO] Starting Avro consumer for topic: {TOPIC_NAME}")
-    print(f"[INFO] Kafka Bootstrap: {BOOTSTRAP_SERVER}")
-    print(f"[INFO] Consumer Group: {CONSUMER_GROUP}")
-    print(f"[INFO] Schema Registry: {SCHEMA_REGISTRY_URL}")
+    consumer, decode_pool, config = _build()
+    stop = install_shutdown_handler()
+
+    print(f"[INFO] Starting Avro consumer for topic: {config['TOPIC_NAME']}")
+    print(f"[INFO] Kafka Bootstrap: {config['BOOTSTRAP_SERVER']}")
+    print(f"[INFO] Consumer Group: {config['CONSUMER_GROUP']}")
+    print(f"[INFO] Schema Registry: {config['SCHEMA_REGISTRY_URL']}")
+    if config["RAW_MODE"]:
+        print("[INFO] Raw mode: records are passed through without Avro decoding.")
 
-    consumer.subscribe([TOPIC_NAME])
+    consumer.subscribe([config["TOPIC_NAME"]])
     print("[INFO] Press Ctrl+C to exit.\n")
 
-    while True:
-        # Poll for messages (1.0 sec timeout)
-        msg = consumer.poll(timeout=1.0)
-        if msg is None:
-            continue  # No new messages
+    # Bind hot-loop callables to locals (LOAD_FAST instead of global/attribute lookups)
+    consume = consumer.consume
+    submit = decode_pool.submit
+    decode = decode_batch
+    max_records = config["MAX_POLL_RECORDS"]
+    raw_mode = config["RAW_MODE"]
+    _EOF = KafkaError._PARTITION_EOF
+    _log = log
 
-        if msg.error():
-            # If it's just partition EOF, keep going
-            if msg.error().code() == KafkaError._PARTITION_EOF:
-                continue
-            else:
-                # Log any other error
-                print(f"[ERROR] {msg.error()}")
+    # Messages of the previous batch and the future decoding all of their values
+    pending_msgs = []
+    pending_future = None
+    timeout = CONSUME_TIMEOUT  # grows while the topic is idle
+
+    while not stop.is_set():
+        # Fetch the next batch while the previous one decodes
+        msgs = consume(num_messages=max_records, timeout=timeout)
+
+        # Log the previous batch in offset order
+        if pending_future is not None:
+            log_decoded_batch(pending_msgs, pending_future.result())
+
+        # Nothing new arrived: don't leave log lines sitting in the buffer, and
+        # wait longer in the next consume() call
+        if not msgs:
+            flush_log()
+            timeout = min(timeout * 2, CONSUME_TIMEOUT_MAX)
+        else:
+            timeout = CONSUME_TIMEOUT
+
+        pending_msgs = []
+        for msg in msgs:
+            err = msg.error()
+            if err:
+                # If it's just partition EOF, keep going
+                if err.code() == _EOF:
+                    continue
+                else:
+                    # Log any other error
+                    _log(f"[ERROR] {err}")
+                    continue
+
+            # Raw mode: forward the bytes untouched; no decode, no registry call
+            if raw_mode:
+                value = msg.value() or b""
+                _log(f"[INFO] Consumed raw record @ offset {msg.offset()}, partition {msg.partition()}: "
+                     f"{len(value)} bytes, schema ID {peek_schema_id(value)}, crc32 {zlib.crc32(value):08x}")
                 continue
-        
-        # Successful message
-        record_value = msg.value()
-        partition = msg.partition()
-        offset = msg.offset()
 
-        # Log the consumed record
-        print(f"[INFO] Consumed record @ offset {offset}, partition {partition}: {record_value}")
+            # Successful message: decode it with the rest of this batch
+            pending_msgs.append(msg)
+
+        # One pool task per batch; a task per record costs more than the decode
+        pending_future = submit(decode, [msg.value() for msg in pending_msgs]) if pending_msgs else None
+
+    # Log the batch still being decoded before close() commits its offsets
+    if pending_future is not None:
+        log_decoded_batch(pending_msgs, pending_future.result())
+    close_consumer(consumer, decode_pool)
+
+# =============================================================================
+# Multi-Process Workers
+# =============================================================================
+def run_workers(worker_count):
+    """
+    Starts 'worker_count' consumer processes that join the same consumer group,
+    letting Kafka spread the topic's partitions across them, and waits for
+    them to exit. SIGINT or SIGTERM is forwarded to every worker.
+    """
+    # Each worker builds its own librdkafka handle after start; never fork one
+    mp.set_start_method("spawn")
+    workers = [mp.Process(target=main, name=f"consumer-worker-{i}") for i in range(worker_count)]
+
+    def handle_shutdown(sig, frame):
+        for worker in workers:
+            if worker.is_alive():
+                worker.terminate()
+
+    signal.signal(signal.SIGINT, handle_shutdown)
+    signal.signal(signal.SIGTERM, handle_shutdown)
+
+    print(f"[INFO] Starting {worker_count} consumer worker processes.")
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
 
 if __name__ == "__main__":
-    main()
+    # Loaded once here; spawned workers inherit the resulting environment
+    load_environment_file()
+
+    # Multi-process mode is opt-in: every worker is a full group member with its
+    # own connection and prefetch queue
+    worker_count = int(os.getenv("WORKERS", "1"))
+    if worker_count > 1:
+        run_workers(worker_count)
+    else:
+        main()
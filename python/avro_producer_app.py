@@ -6,13 +6,16 @@ A Python producer application that:
   1. Connects to Confluent Cloud Kafka (SASL_SSL, PLAIN).
   2. Connects to Confluent Cloud Schema Registry to serialize Avro messages.
   3. Automatically registers or references a simple Avro schema for messages.
-  4. Generates random data adhering to that Avro schema every 'MESSAGE_INTERVAL'
-     seconds (by default, 1 second).
-  5. Publishes those messages to a specified Kafka topic.
+  4. Generates a batch of 'BATCH_SIZE' random records adhering to that Avro
+     schema every 'MESSAGE_INTERVAL' seconds (by default, 100 records every
+     1 second).
+  5. Publishes those messages to a specified Kafka topic, letting librdkafka
+     coalesce each batch into as few produce requests as possible.
 
 Prerequisites:
   - Install dependencies:
       - pip install "confluent-kafka[avro]" "python-dotenv"
+      - Optional, for faster record logging: pip install orjson
   - Ensure you have a Confluent Cloud Kafka cluster with appropriate permissions:
       - API Key/Secret with produce access to the Kafka cluster.
       - Schema Registry API Key/Secret with READWRITE permissions.
@@ -25,7 +28,14 @@ Prerequisites:
       - `SCHEMA_REGISTRY_API_KEY` → Schema Registry API key
       - `SCHEMA_REGISTRY_API_SECRET` → Schema Registry API secret
   - Optional environment variables:
-      - `MESSAGE_INTERVAL` → Time interval in seconds between producing messages (default: `1.0`)
+      - `MESSAGE_INTERVAL` → Time interval in seconds between producing batches (default: `1.0`)
+      - `BATCH_SIZE` → Number of messages produced per interval (default: `100`)
+      - `LINGER_MS` → Time librdkafka waits to fill a batch before sending (default: `50`)
+      - `BATCH_NUM_MESSAGES` → Max messages per produce request (default: `10000`)
+      - `COMPRESSION_TYPE` → Compression codec: none, gzip, snappy, lz4, zstd (default: `lz4`)
+      - `COMPRESSION_LEVEL` → Codec-specific compression level, -1 for the codec default (default: `-1`)
+      - `QUEUE_BUFFERING_MAX_MESSAGES` → Max messages buffered in the local producer queue (default: `100000`)
+      - `STATS_INTERVAL_MS` → Interval for aggregate producer statistics, 0 to disable (default: `10000`)
 
 
 Usage:
@@ -44,16 +54,18 @@ Press Ctrl+C (SIGINT) to exit gracefully.
 
 import os
 import sys
+import json
 import time
+import base64
 import random
-import string
 import signal
+import struct
+from io import BytesIO
+import fastavro
 from dotenv import load_dotenv
-from confluent_kafka import SerializingProducer
-from confluent_kafka.serialization import StringSerializer
-from confluent_kafka.schema_registry import SchemaRegistryClient
-from confluent_kafka.schema_registry.avro import AvroSerializer
-from confluent_kafka.serialization import SerializationContext, MessageField
+from confluent_kafka import Producer
+from confluent_kafka.schema_registry import Schema
+from common import get_sr_client, format_record
 
 # =============================================================================
 # Load Environment Variables from .env File
@@ -115,161 +127,276 @@ TRANSACTION_SCHEMA_STR = """
 }
 """
 
-def transaction_to_avro(transaction, ctx):
+# Parsed once; every record is encoded directly against this schema
+PARSED_TRANSACTION_SCHEMA = fastavro.parse_schema(json.loads(TRANSACTION_SCHEMA_STR))
+
+# =============================================================================
+# Configuration
+# =============================================================================
+def load_config():
+    """
+    Validates that all required variables are set and returns the producer
+    settings as a dictionary keyed by variable name. The environment file
+    must already be loaded (see load_environment_file()).
+    """
+    # Validate that all required environment variables are set
+    required_vars = [
+        "BOOTSTRAP_SERVER",
+        "SASL_USERNAME",
+        "SASL_PASSWORD",
+        "TOPIC_NAME",
+        "SCHEMA_REGISTRY_URL",
+        "SCHEMA_REGISTRY_API_KEY",
+        "SCHEMA_REGISTRY_API_SECRET"
+    ]
+
+    missing_vars = [var for var in required_vars if os.getenv(var) is None]
+    if missing_vars:
+        print(f"[ERROR] Missing required environment variables: {', '.join(missing_vars)}")
+        sys.exit(1)
+
     return {
-        "transaction_id": transaction['transaction_id'],
-        "customer_id": transaction['customer_id'],
-        "amount": transaction['amount'],
-        "timestamp_ms": transaction['timestamp_ms']
+        "BOOTSTRAP_SERVER": os.getenv("BOOTSTRAP_SERVER"),
+        "SASL_USERNAME": os.getenv("SASL_USERNAME"),
+        "SASL_PASSWORD": os.getenv("SASL_PASSWORD"),
+        "TOPIC_NAME": os.getenv("TOPIC_NAME"),
+        "SCHEMA_REGISTRY_URL": os.getenv("SCHEMA_REGISTRY_URL"),
+
+        # Optional configurations
+        "MESSAGE_INTERVAL": float(os.getenv("MESSAGE_INTERVAL", "1.0")),  # seconds
+        "BATCH_SIZE": int(os.getenv("BATCH_SIZE", "100")),  # messages per interval
+        "LINGER_MS": int(os.getenv("LINGER_MS", "50")),
+        "BATCH_NUM_MESSAGES": int(os.getenv("BATCH_NUM_MESSAGES", "10000")),
+        "COMPRESSION_TYPE": os.getenv("COMPRESSION_TYPE", "lz4"),  # lz4 is near-free on CPU; zstd compresses better
+        "COMPRESSION_LEVEL": int(os.getenv("COMPRESSION_LEVEL", "-1")),
+        "QUEUE_BUFFERING_MAX_MESSAGES": int(os.getenv("QUEUE_BUFFERING_MAX_MESSAGES", "100000")),
+        "STATS_INTERVAL_MS": int(os.getenv("STATS_INTERVAL_MS", "10000"))  # 0 disables statistics
     }
 
 # =============================================================================
-# Configuration
+# Avro Serialization
 # =============================================================================
-load_environment_file()
-
-BOOTSTRAP_SERVER = os.getenv("BOOTSTRAP_SERVER")
-SASL_USERNAME = os.getenv("SASL_USERNAME")
-SASL_PASSWORD = os.getenv("SASL_PASSWORD")
-TOPIC_NAME = os.getenv("TOPIC_NAME")
-
-SCHEMA_REGISTRY_URL = os.getenv("SCHEMA_REGISTRY_URL")
-SCHEMA_REGISTRY_API_KEY = os.getenv("SCHEMA_REGISTRY_API_KEY")
-SCHEMA_REGISTRY_API_SECRET = os.getenv("SCHEMA_REGISTRY_API_SECRET")
-
-# Optional configurations
-MESSAGE_INTERVAL = float(os.getenv("MESSAGE_INTERVAL", "1.0"))  # seconds
-
-# Validate that all required environment variables are set
-required_vars = [
-    "BOOTSTRAP_SERVER",
-    "SASL_USERNAME",
-    "SASL_PASSWORD",
-    "TOPIC_NAME",
-    "SCHEMA_REGISTRY_URL",
-    "SCHEMA_REGISTRY_API_KEY",
-    "SCHEMA_REGISTRY_API_SECRET"
-]
-
-missing_vars = [var for var in required_vars if os.getenv(var) is None]
-if missing_vars:
-    print(f"[ERROR] Missing required environment variables: {', '.join(missing_vars)}")
-    sys.exit(1)
-
-# Schema Registry Client Configuration
-schema_registry_conf = {
-    'url': SCHEMA_REGISTRY_URL,
-    'basic.auth.user.info': f"{SCHEMA_REGISTRY_API_KEY}:{SCHEMA_REGISTRY_API_SECRET}"
-}
-schema_registry_client = SchemaRegistryClient(schema_registry_conf)
+def make_transaction_serializer(schema_id):
+    """
+    Returns a function that encodes a transaction dictionary in the Confluent
+    Avro wire format using the pre-parsed schema and the given, already
+    registered, schema ID.
+    """
+    # Confluent wire-format header: magic byte 0 followed by the 4-byte schema ID
+    header = b'\x00' + struct.pack('>I', schema_id)
+    parsed_schema = PARSED_TRANSACTION_SCHEMA
+
+    def serialize_transaction(transaction):
+        buf = BytesIO()
+        buf.write(header)
+        fastavro.schemaless_writer(buf, parsed_schema, transaction)
+        return buf.getvalue()
 
-# Avro Serializer
-avro_serializer = AvroSerializer(
-    schema_registry_client,
-    TRANSACTION_SCHEMA_STR,
-    transaction_to_avro
-)
+    return serialize_transaction
 
 # =============================================================================
-# Producer Configuration
+# Buffered Logging
 # =============================================================================
-producer_conf = {
-    "bootstrap.servers": BOOTSTRAP_SERVER,
-    "security.protocol": "SASL_SSL",
-    "sasl.mechanism": "PLAIN",
-    "sasl.username": SASL_USERNAME,
-    "sasl.password": SASL_PASSWORD,
-    "key.serializer": StringSerializer('utf_8'),
-    "value.serializer": avro_serializer
-}
+LOG_FLUSH_LINES = 256     # flush after this many buffered lines...
+LOG_FLUSH_INTERVAL = 1.0  # ...or after this many seconds, whichever comes first
 
-producer = SerializingProducer(producer_conf)
+_log_buffer = []
+_log_last_flush = time.monotonic()
+
+def flush_log():
+    """
+    Write all buffered log lines to stdout in a single call.
+    """
+    global _log_last_flush
+    if _log_buffer:
+        sys.stdout.write("\n".join(_log_buffer) + "\n")
+        sys.stdout.flush()
+        _log_buffer.clear()
+    _log_last_flush = time.monotonic()
+
+def log(line):
+    """
+    Buffer a log line for the hot path instead of printing it immediately.
+    """
+    _log_buffer.append(line)
+    if len(_log_buffer) >= LOG_FLUSH_LINES or time.monotonic() - _log_last_flush > LOG_FLUSH_INTERVAL:
+        flush_log()
 
 # =============================================================================
-# Graceful Shutdown Handler
+# Delivery and Statistics Callbacks
 # =============================================================================
-def handle_shutdown(signal_received, frame):
+def delivery_callback(err, msg):
     """
-    Called when a termination signal (SIGINT, SIGTERM) is received.
-    Flush pending messages and exit the process.
+    Installed producer-wide with 'delivery.report.only.error', so it is only
+    invoked for messages that failed delivery.
     """
-    print("\n[INFO] Shutdown signal received. Flushing producer.")
-    producer.flush(timeout=10)
-    sys.exit(0)
+    if err:
+        log(f"[ERROR] Message failed delivery to {msg.topic()} [{msg.partition()}]: {err}")
 
-# Capture Ctrl+C and other termination signals
-signal.signal(signal.SIGINT, handle_shutdown)
-signal.signal(signal.SIGTERM, handle_shutdown)
+def stats_callback(stats_json):
+    """
+    Log aggregate producer statistics every STATS_INTERVAL_MS milliseconds.
+    """
+    stats = json.loads(stats_json)
+    log(f"[INFO] Producer stats: {stats['txmsgs']} message(s) sent, {stats['msg_cnt']} queued")
 
 # =============================================================================
-# Random Data Generation
+# Producer Construction
 # =============================================================================
-def generate_random_transaction():
+def _build():
     """
-    Generate a random transaction record matching the Avro schema defined above.
-    Returns a Python dictionary that will be Avro-serialized by AvroSerializer.
-    """
-    transaction_id = "".join(random.choices(string.ascii_uppercase + string.digits, k=8))
-    customer_id = "".join(random.choices(string.ascii_lowercase, k=6))
-    amount = round(random.uniform(1.0, 1000.0), 2)
-    timestamp_ms = int(time.time() * 1000)
+    Loads the configuration, registers the schema, and creates the producer.
+    Nothing connects to Kafka or Schema Registry until this is called, so the
+    module can be imported (or a process forked) without side effects.
 
-    return {
-        "transaction_id": transaction_id,
-        "customer_id": customer_id,
-        "amount": amount,
-        "timestamp_ms": timestamp_ms
+    Returns a (producer, serialize_transaction, config) tuple.
+    """
+    config = load_config()
+
+    # Register the schema once at startup under the topic's value subject
+    schema_id = get_sr_client().register_schema(
+        f"{config['TOPIC_NAME']}-value",
+        Schema(TRANSACTION_SCHEMA_STR, 'AVRO')
+    )
+
+    producer_conf = {
+        "bootstrap.servers": config["BOOTSTRAP_SERVER"],
+        "security.protocol": "SASL_SSL",
+        "sasl.mechanism": "PLAIN",
+        "sasl.username": config["SASL_USERNAME"],
+        "sasl.password": config["SASL_PASSWORD"],
+        # Batching: let librdkafka coalesce each produced batch into few requests
+        "linger.ms": config["LINGER_MS"],
+        "batch.num.messages": config["BATCH_NUM_MESSAGES"],
+        # Compression: Avro batches with repetitive content shrink several times over
+        "compression.type": config["COMPRESSION_TYPE"],
+        "compression.level": config["COMPRESSION_LEVEL"],
+        "queue.buffering.max.messages": config["QUEUE_BUFFERING_MAX_MESSAGES"],
+        # Delivery reports: only failures call back into Python; successes are
+        # reported in aggregate by the periodic statistics callback
+        "on_delivery": delivery_callback,
+        "delivery.report.only.error": True,
+        "stats_cb": stats_callback,
+        "statistics.interval.ms": config["STATS_INTERVAL_MS"]
     }
 
+    return Producer(producer_conf), make_transaction_serializer(schema_id), config
+
 # =============================================================================
-# Delivery Callback
+# Graceful Shutdown Handler
 # =============================================================================
-def delivery_callback(err, msg):
-    if err:
-        print(f"[ERROR] Message failed delivery: {err}")
-    else:
-        print(f"[INFO] Message delivered to {msg.topic()} [{msg.partition()}] at offset {msg.offset()}")
+def install_shutdown_handler(producer):
+    """
+    Registers a handler for termination signals (SIGINT, SIGTERM) that
+    flushes pending messages and exits the process.
+    """
+    def handle_shutdown(signal_received, frame):
+        flush_log()
+        print("\n[INFO] Shutdown signal received. Flushing producer.")
+        producer.flush(timeout=10)
+        flush_log()  # delivery reports served during flush()
+        sys.exit(0)
+
+    # Capture Ctrl+C and other termination signals
+    signal.signal(signal.SIGINT, handle_shutdown)
+    signal.signal(signal.SIGTERM, handle_shutdown)
+
+# =============================================================================
+# Random Data Generation
+# =============================================================================
+# Bound once to skip the attribute lookup on every generated record
+_time_ns = time.time_ns
+
+# Reused for every record: produce() serializes synchronously, so the dict is
+# free to be overwritten as soon as the call returns
+_transaction_record = {
+    "transaction_id": "",
+    "customer_id": "",
+    "amount": 0.0,
+    "timestamp_ms": 0
+}
+
+def generate_random_transaction():
+    """
+    Generate a random transaction record matching the Avro schema defined above.
+    Returns a Python dictionary that will be Avro-serialized by serialize_transaction().
+
+    The same dictionary is returned on every call, updated in place; serialize
+    or copy it before calling this function again.
+    """
+    record = _transaction_record
+    # One urandom call + C-level encoding each, rather than a Python-level choice per character
+    record["transaction_id"] = base64.b32encode(os.urandom(5)).decode()  # 8 chars, A-Z and 2-7
+    record["customer_id"] = os.urandom(3).hex()  # 6 chars, 0-9 and a-f
+    record["amount"] = round(random.uniform(1.0, 1000.0), 2)
+    record["timestamp_ms"] = _time_ns() // 1_000_000  # integer math, no float rounding
+    return record
 
 # =============================================================================
 # Main Producer Loop
 # =============================================================================
 def main():
     """
-    Produce random Avro-serialized messages to the specified topic at
-    a specified interval.
+    Produce batches of random Avro-serialized messages to the specified
+    topic at a specified interval.
     """
+    producer, serialize, config = _build()
+    install_shutdown_handler(producer)
+
     print("[INFO] Starting Avro producer for Confluent Cloud...")
-    print(f"[INFO] Kafka Bootstrap: {BOOTSTRAP_SERVER}")
-    print(f"[INFO] Topic: {TOPIC_NAME}")
-    print(f"[INFO] Schema Registry: {SCHEMA_REGISTRY_URL}")
-    print(f"[INFO] Producing a message every {MESSAGE_INTERVAL} seconds.\n")
+    print(f"[INFO] Kafka Bootstrap: {config['BOOTSTRAP_SERVER']}")
+    print(f"[INFO] Topic: {config['TOPIC_NAME']}")
+    print(f"[INFO] Schema Registry: {config['SCHEMA_REGISTRY_URL']}")
+    print(f"[INFO] Producing {config['BATCH_SIZE']} message(s) every {config['MESSAGE_INTERVAL']} seconds.\n")
     print("[INFO] Press Ctrl+C to exit.")
 
+    # Bind hot-loop callables to locals (LOAD_FAST instead of global/attribute lookups)
+    produce = producer.produce
+    poll = producer.poll
+    generate = generate_random_transaction
+    topic = config["TOPIC_NAME"]
+    batch_size = config["BATCH_SIZE"]
+    interval = config["MESSAGE_INTERVAL"]
+    _log = log
+
+    next_tick = time.monotonic()
     while True:
         try:
-            # Generate random data that matches the Avro schema
-            transaction_record = generate_random_transaction()
+            for _ in range(batch_size):
+                # Generate random data that matches the Avro schema
+                transaction_record = generate()
 
-            # Produce the message to Kafka
-            producer.produce(
-                topic=TOPIC_NAME,
-                value=transaction_record,
-                key=None,  # or define your Avro key data if using
-                on_delivery=delivery_callback
-            )
+                # Produce the message to Kafka
+                produce(
+                    topic=topic,
+                    value=serialize(transaction_record),
+                    key=None  # or define your Avro key data if using
+                )
 
-            # Poll to handle delivery reports
-            producer.poll(0)
+                # Simple logging
+                _log(f"[INFO] Produced record: {format_record(transaction_record)}")
 
-            # Simple logging
-            print(f"[INFO] Produced record: {transaction_record}")
+            # Poll once per batch to serve failed delivery reports and statistics
+            poll(0)
 
-            # Sleep for the configured interval
-            time.sleep(MESSAGE_INTERVAL)
+            # Write out the batch's log lines before going idle
+            flush_log()
 
         except Exception as err:
             # In production, implement more robust error handling
-            print(f"[ERROR] Exception while producing message: {err}")
+            log(f"[ERROR] Exception while producing message: {err}")
+
+        # Sleep until the next tick's deadline, so the time spent producing
+        # counts against the interval instead of adding to it
+        next_tick += interval
+        delay = next_tick - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        elif delay < -interval:
+            # Stalled for more than a whole tick (suspended host, slow broker):
+            # drop the missed ticks rather than replaying them as one burst
+            next_tick = time.monotonic()
 
 if __name__ == "__main__":
+    load_environment_file()
     main()
@@ -0,0 +1,64 @@
+"""
+common.py
+
+Helpers shared by avro_producer_app.py and avro_consumer_app.py.
+
+  - get_sr_client() → A single, lazily created Schema Registry client per
+    process, so a process that embeds both the producer and the consumer
+    reuses one HTTP connection pool (and one set of TLS handshakes) for all
+    schema lookups.
+  - format_record() → Renders a record for log lines: compact JSON via orjson
+    when it is installed, plain repr() otherwise.
+
+get_sr_client() requires the Schema Registry environment variables
+(SCHEMA_REGISTRY_URL, SCHEMA_REGISTRY_API_KEY, SCHEMA_REGISTRY_API_SECRET) to be
+loaded before its first call.
+"""
+
+import os
+import functools
+from confluent_kafka.schema_registry import SchemaRegistryClient
+
+try:
+    import orjson  # optional: C-implemented JSON encoder, much faster than repr()/json
+except ImportError:
+    orjson = None
+
+# =============================================================================
+# Schema Registry Client
+# =============================================================================
+@functools.lru_cache(maxsize=1)
+def get_sr_client():
+    """
+    Returns the process-wide Schema Registry client, creating it on first use.
+    """
+    schema_registry_conf = {
+        "url": os.getenv("SCHEMA_REGISTRY_URL"),
+        "basic.auth.user.info": f"{os.getenv('SCHEMA_REGISTRY_API_KEY')}:{os.getenv('SCHEMA_REGISTRY_API_SECRET')}",
+        # Keep schema lookups in the client's cache; the schemas used here
+        # rarely change, so the latest-version cache can live for an hour
+        "cache.capacity": 1000,
+        "cache.latest.ttl.sec": 3600
+    }
+    return SchemaRegistryClient(schema_registry_conf)
+
+# =============================================================================
+# Record Formatting
+# =============================================================================
+# Avro records can carry values JSON has no type for (bytes/fixed, decimal,
+# uuid, date/time logical types): orjson renders those with repr(), and a record
+# it still cannot encode falls back to repr() as a whole, so logging a valid
+# record never raises
+if orjson is not None:
+    def format_record(record):
+        """
+        Returns a record as a compact JSON string for logging.
+        """
+        try:
+            return orjson.dumps(record, default=repr).decode()
+        except TypeError:  # orjson.JSONEncodeError, e.g. integers beyond 64 bits
+            return repr(record)
+else:
+    # Without orjson, repr() is the fastest option; the standard json module
+    # is several times slower
+    format_record = repr